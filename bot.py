@@ -1,18 +1,32 @@
 import os
+import json
+import queue
+import atexit
+import hashlib
+import signal
 import logging
+import logging.handlers
 import datetime
 import asyncio
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import Awaitable, Callable, List, Literal, Optional, Union
 
 import discord
 from discord import app_commands
 
 # local modules — assumed in repo
+import cache
 import mal_client
 import utils
-
-# logging
-logging.basicConfig(level=logging.INFO)
+from models import Anime, Manga
+
+# logging: records are formatted by a QueueHandler and written to stderr by a listener thread,
+# so a slow stdout/stderr never blocks the event loop mid-command
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_log_queue)])
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger("ani_lumina")
 
 # Load env (if using python-dotenv locally)
@@ -24,6 +38,9 @@ except Exception:
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 MAL_CLIENT_ID = os.getenv("MAL_CLIENT_ID")  # recommended to set in env
+GUILD_ID = os.getenv("GUILD_ID")  # optional: sync commands to one guild (instant) while developing
+COMMAND_HASH_FILE = os.getenv("COMMAND_HASH_FILE", ".cmdhash")
+CACHE_SWEEP_INTERVAL = 60  # seconds between sweeps of expired MAL cache entries
 
 # If you want to hardcode MAL client id for quick testing (not recommended):
 # os.environ["MAL_CLIENT_ID"] = "PASTE_CLIENT_ID_HERE"  # <-- add client id here (not recommended)
@@ -36,11 +53,58 @@ intents = discord.Intents.none()  # minimal intents for slash commands
 # if you need message content or member intents, enable here and in Discord Developer Portal
 # intents.message_content = True
 
-bot = discord.Client(intents=intents)
+
+class AniLumina(discord.Client):
+    """
+    Discord client that owns a single long-lived MALClient, so every command
+    reuses the same aiohttp session (keep-alive, pooled TLS connections).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.mal: Optional[mal_client.MALClient] = None
+        self._cache_sweeper: Optional["asyncio.Task[None]"] = None
+
+    async def setup_hook(self):
+        # runs once before the gateway connects, unlike on_ready which fires again on every reconnect
+        if MAL_CLIENT_ID:
+            self.mal = mal_client.MALClient(client_id=MAL_CLIENT_ID)
+        else:
+            logger.warning("MAL_CLIENT_ID is not set; MAL commands will fail until it is configured.")
+        self._cache_sweeper = asyncio.create_task(self._sweep_cache())
+        try:
+            await sync_commands()
+        except Exception:
+            logger.exception("Failed to sync commands.")
+
+    async def _sweep_cache(self):
+        # the LRU bound caps entry count; this frees expired entries that are never looked up again
+        while True:
+            await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+            cache.CACHE.purge_expired()
+
+    async def close(self):
+        if self._cache_sweeper is not None:
+            self._cache_sweeper.cancel()
+        try:
+            await super().close()
+        finally:
+            if self.mal is not None:
+                await self.mal.close()
+
+
+bot = AniLumina(intents=intents)
 tree = app_commands.CommandTree(bot)
 
 
-def compact_embed_for_results(kind: str, query: str, results: List[Dict[str, Any]]) -> discord.Embed:
+def get_mal() -> mal_client.MALClient:
+    """Return the shared MAL client created in setup_hook."""
+    if bot.mal is None:
+        raise RuntimeError("MAL_CLIENT_ID is missing")
+    return bot.mal
+
+
+def compact_embed_for_results(kind: str, query: str, results: List[Union[Anime, Manga]]) -> discord.Embed:
     """
     Build a compact embed listing up to len(results) items. Small thumbnail (first result).
     Each result becomes an embed field with short lines.
@@ -53,154 +117,179 @@ def compact_embed_for_results(kind: str, query: str, results: List[Dict[str, Any
         return embed
 
     # first result thumbnail (small)
-    first_img = utils.extract_image_url(results[0])
+    first_img = results[0].picture
     if first_img:
         # use thumbnail (small)
         embed.set_thumbnail(url=first_img)
 
-    # Add up to 15 results — each as a field (compact)
-    for idx, item in enumerate(results[:15], start=1):
+    # Add up to 10 results (the most MAL returns per search) — each as a field (compact); helpers hoisted out of the loop
+    format_title, format_meta, add_field = utils._format_title_and_url, utils._format_meta_line, embed.add_field
+    for idx, item in enumerate(islice(results, 10), start=1):
         # name and URL
-        title_line, mal_url = utils._format_title_and_url(item, kind)
-        # meta lines: rating, rank, episodes, status, start date
-        meta = utils._format_meta_line(item)
-        # short description lines
-        value_lines = []
-        if meta:
-            value_lines.append(meta)
-        if mal_url:
-            value_lines.append(f"[Open on MAL]({mal_url})")
-        # ensure short field values
-        field_value = "\n".join(value_lines) or "\u200b"
-        # field name: "1. Title"
-        field_name = f"{idx}. {title_line}"
-        embed.add_field(name=field_name, value=field_value, inline=False)
+        title_line, mal_url = format_title(item)
+        # meta line: rating, rank, episodes, status, start date
+        meta = format_meta(item)
+        link = f"[Open on MAL]({mal_url})" if mal_url else ""
+        # at most two short lines: meta and link
+        field_value = (meta + "\n" + link if meta and link else meta or link) or "\u200b"
+        add_field(name=f"{idx}. {title_line}", value=field_value, inline=False)
 
     return embed
 
 
-@tree.command(name="anime", description="Search anime on MAL (compact results)")
-@app_commands.describe(query="Anime name to search", limit="Max results to fetch (max 15)")
-async def anime(interaction: discord.Interaction, query: str, limit: Optional[int] = 15):
+async def respond(interaction: discord.Interaction, build: Callable[..., Awaitable[discord.Embed]], *args) -> None:
+    """
+    Shared body of every command: defer, build the reply embed with `build(*args)`
+    (usually a MAL lookup) and send it, or send an error embed if building fails.
+    """
     await interaction.response.defer(thinking=True)
     try:
-        limit = max(1, min(15, limit or 15))
-        results = await mal_client.search("anime", query, limit=limit)
-        embed = compact_embed_for_results("anime", query, results)
-        await interaction.followup.send(embed=embed)
+        embed = await build(*args)
     except Exception as e:
-        logger.exception("Error in /anime")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+        logger.exception(f"Error in /{interaction.command.name if interaction.command else '?'}")
+        embed = utils.error_embed(str(e))
+    await interaction.followup.send(embed=embed)
+
+
+async def search_embed(kind: str, query: str, limit: int) -> discord.Embed:
+    items = await get_mal().search(kind, query, limit=limit)
+    return compact_embed_for_results(kind, query, items)
+
+
+async def info_embed(identifier: str, kind: str) -> discord.Embed:
+    data = await get_mal().info(identifier, kind=kind)
+    return utils.embed_from_info(data, kind=kind)
+
+
+async def schedule_embed(day: str) -> discord.Embed:
+    return compact_embed_for_results("schedule", day, await get_mal().schedule(day))
+
+
+async def next_season_embed() -> discord.Embed:
+    return compact_embed_for_results("next_season", "next season", await get_mal().next_season())
+
+
+@tree.command(name="anime", description="Search anime on MAL (compact results)")
+@app_commands.describe(query="Anime name to search", limit="Max results to fetch (max 10)")
+async def anime(interaction: discord.Interaction, query: str, limit: app_commands.Range[int, 1, 10] = 10):
+    await respond(interaction, search_embed, "anime", query, limit)
 
 
 @tree.command(name="manga", description="Search manga on MAL (compact results)")
-@app_commands.describe(query="Manga name to search", limit="Max results to fetch (max 15)")
-async def manga(interaction: discord.Interaction, query: str, limit: Optional[int] = 15):
-    await interaction.response.defer(thinking=True)
-    try:
-        limit = max(1, min(15, limit or 15))
-        results = await mal_client.search("manga", query, limit=limit)
-        embed = compact_embed_for_results("manga", query, results)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /manga")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+@app_commands.describe(query="Manga name to search", limit="Max results to fetch (max 10)")
+async def manga(interaction: discord.Interaction, query: str, limit: app_commands.Range[int, 1, 10] = 10):
+    await respond(interaction, search_embed, "manga", query, limit)
 
 
 @tree.command(name="info", description="Get info about an anime or manga by id or url")
 @app_commands.describe(kind="Kind (anime/manga)", identifier="id or url or title")
-async def info(interaction: discord.Interaction, identifier: str, kind: str = "anime"):
+async def info(interaction: discord.Interaction, identifier: str, kind: Literal["anime", "manga"] = "anime"):
     """
     NOTE: signature uses identifier first to avoid positional/default mismatch.
     """
-    await interaction.response.defer(thinking=True)
-    try:
-        data = await mal_client.info(identifier, kind=kind)
-        embed = utils.embed_from_info(data, kind=kind)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /info")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+    await respond(interaction, info_embed, identifier, kind)
 
 
 # Additional commands you requested (character, staff/voice actor, studio, schedule, nextseason)
 @tree.command(name="character", description="Search character on MAL")
 @app_commands.describe(query="Character name to search", limit="Max results to fetch (max 10)")
-async def character(interaction: discord.Interaction, query: str, limit: Optional[int] = 5):
-    await interaction.response.defer(thinking=True)
-    try:
-        limit = max(1, min(10, limit or 5))
-        results = await mal_client.search("character", query, limit=limit)
-        embed = compact_embed_for_results("character", query, results)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /character")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+async def character(interaction: discord.Interaction, query: str, limit: app_commands.Range[int, 1, 10] = 5):
+    await respond(interaction, search_embed, "character", query, limit)
 
 
 @tree.command(name="voiceactor", description="Search voice actor / seiyuu on MAL")
 @app_commands.describe(query="Voice actor name to search", limit="Max results to fetch (max 10)")
-async def voiceactor(interaction: discord.Interaction, query: str, limit: Optional[int] = 5):
-    await interaction.response.defer(thinking=True)
-    try:
-        limit = max(1, min(10, limit or 5))
-        results = await mal_client.search("people", query, limit=limit)
-        embed = compact_embed_for_results("people", query, results)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /voiceactor")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+async def voiceactor(interaction: discord.Interaction, query: str, limit: app_commands.Range[int, 1, 10] = 5):
+    await respond(interaction, search_embed, "people", query, limit)
 
 
 @tree.command(name="studio", description="Search studios / production houses on MAL")
 @app_commands.describe(query="Studio name to search", limit="Max results to fetch (max 10)")
-async def studio(interaction: discord.Interaction, query: str, limit: Optional[int] = 5):
-    await interaction.response.defer(thinking=True)
-    try:
-        limit = max(1, min(10, limit or 5))
-        results = await mal_client.search("studio", query, limit=limit)
-        embed = compact_embed_for_results("studio", query, results)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /studio")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+async def studio(interaction: discord.Interaction, query: str, limit: app_commands.Range[int, 1, 10] = 5):
+    await respond(interaction, search_embed, "studio", query, limit)
 
 
 @tree.command(name="schedule", description="Show anime schedule for a day (e.g. monday)")
 @app_commands.describe(day="Day name (monday, tuesday, ...)")
 async def schedule(interaction: discord.Interaction, day: str = "today"):
-    await interaction.response.defer(thinking=True)
-    try:
-        results = await mal_client.schedule(day)
-        embed = compact_embed_for_results("schedule", day, results)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /schedule")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+    await respond(interaction, schedule_embed, day)
 
 
 @tree.command(name="nextseason", description="List animes planned for the next season")
 async def nextseason(interaction: discord.Interaction):
-    await interaction.response.defer(thinking=True)
+    await respond(interaction, next_season_embed)
+
+
+def _command_tree_hash(guild: Optional[discord.Object]) -> str:
+    """
+    Digest of the command payload Discord would receive, scoped to the sync target and the
+    application (set once logged in), so a kept hash file never skips a new application's sync.
+    """
+    payload = [c.to_dict(tree) for c in tree.get_commands(guild=guild)]
+    raw = json.dumps({"application": bot.application_id, "guild": GUILD_ID, "commands": payload}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+async def sync_commands() -> None:
+    """
+    Sync slash commands, skipping the REST round-trip when the command tree is unchanged
+    since the last successful sync. With GUILD_ID set, commands are copied to that guild
+    (instant propagation) instead of being synced globally.
+    """
+    guild = discord.Object(id=int(GUILD_ID)) if GUILD_ID else None
+    if guild is not None:
+        tree.copy_global_to(guild=guild)
+    digest = _command_tree_hash(guild)
     try:
-        results = await mal_client.next_season()
-        embed = compact_embed_for_results("next_season", "next season", results)
-        await interaction.followup.send(embed=embed)
-    except Exception as e:
-        logger.exception("Error in /nextseason")
-        await interaction.followup.send(embed=utils.error_embed(str(e)))
+        with open(COMMAND_HASH_FILE) as f:
+            if f.read().strip() == digest:
+                logger.info("Slash commands unchanged; skipping sync.")
+                return
+    except OSError:
+        pass
+    await tree.sync(guild=guild)
+    try:
+        with open(COMMAND_HASH_FILE, "w") as f:
+            f.write(digest)
+    except OSError:
+        logger.warning("Could not write %s; commands will be re-synced next start.", COMMAND_HASH_FILE)
+    logger.info("Slash commands synced.")
 
 
 @bot.event
 async def on_ready():
     logger.info(f"Logged in as {bot.user} (id: {bot.user.id})")
-    # Sync commands to your application (global). For development, consider syncing to a guild.
-    try:
-        await tree.sync()
-        logger.info("Slash commands synced.")
-    except Exception:
-        logger.exception("Failed to sync commands.")
+
+
+# strong references to shutdown tasks; the event loop only keeps weak ones
+_shutdown_tasks: "set[asyncio.Task[None]]" = set()
+
+
+def _on_sigterm() -> None:
+    task = asyncio.get_running_loop().create_task(bot.close())
+    _shutdown_tasks.add(task)
+    task.add_done_callback(_shutdown_tasks.discard)
+
+
+async def main() -> None:
+    loop = asyncio.get_running_loop()
+    async with bot:
+        # Render stops instances with SIGTERM; close the bot (and its MAL session) cleanly on it
+        try:
+            loop.add_signal_handler(signal.SIGTERM, _on_sigterm)
+        except NotImplementedError:  # e.g. Windows event loops
+            pass
+        await bot.start(DISCORD_TOKEN)
 
 
 if __name__ == "__main__":
-    bot.run(DISCORD_TOKEN)
+    # uvloop (libuv-based event loop) speeds up socket I/O when available; not on Windows
+    try:
+        import uvloop
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+    try:
+        run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,41 +1,80 @@
 # cache.py
 import time
 import asyncio
-from typing import Any, Dict, Tuple, Optional, Callable, Awaitable
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple, Optional, Callable, Awaitable
 
 class TTLCache:
-    def __init__(self):
-        self._store: Dict[str, Tuple[float, Any]] = {}
-        self._lock = asyncio.Lock()
-
-    async def get(self, key: str) -> Optional[Any]:
-        async with self._lock:
-            item = self._store.get(key)
-            if not item:
-                return None
-            exp, val = item
-            if exp and exp < time.time():
-                self._store.pop(key, None)
-                return None
-            return val
-
-    async def set(self, key: str, value: Any, ttl: int = 0) -> None:
-        async with self._lock:
-            exp = time.time() + ttl if ttl else 0
-            self._store[key] = (exp, value)
+    """
+    TTL cache bounded to `maxsize` entries; the least recently used entry is evicted first.
+    get/set never await, so on the single event-loop thread they cannot interleave and need no lock.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self._store: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._maxsize = maxsize
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._store.get(key)
+        if item is None:
+            return None
+        exp, val = item
+        if exp and exp < time.monotonic():
+            self._store.pop(key, None)
+            return None
+        self._store.move_to_end(key)
+        return val
+
+    def set(self, key: Hashable, value: Any, ttl: int = 0) -> None:
+        exp = time.monotonic() + ttl if ttl else 0
+        self._store[key] = (exp, value)
+        self._store.move_to_end(key)
+        while len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry, including ones that are never read again; returns how many."""
+        now = time.monotonic()
+        expired = [k for k, (exp, _) in self._store.items() if exp and exp < now]
+        for k in expired:
+            del self._store[k]
+        return len(expired)
 
 CACHE = TTLCache()
+# in-flight cache fills, so concurrent misses for one key share a single call
+_INFLIGHT: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+async def _fill(key: Hashable, ttl: int, func: Callable[..., Awaitable[Any]], args, kwargs) -> Any:
+    result = await func(*args, **kwargs)
+    CACHE.set(key, result, ttl)
+    return result
 
 def aiorun_cached(ttl: int) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
-    """Decorator for caching async funcs by args+kwargs stringified key."""
+    """
+    Decorator for caching async funcs, keyed on (qualname, args, sorted kwargs) as a plain tuple.
+    Concurrent misses for the same key await one shared call instead of each calling func.
+    `wrapped.prime(value, *args, **kwargs)` stores a result for those args without calling func.
+    """
     def wrap(func: Callable[..., Awaitable[Any]]):
+        def make_key(args, kwargs) -> Hashable:
+            return (func.__qualname__, args, tuple(sorted(kwargs.items())) if kwargs else ())
+
         async def inner(*args, **kwargs):
-            key = f"{func.__name__}|{args}|{sorted(kwargs.items())}"
-            cached = await CACHE.get(key)
+            key = make_key(args, kwargs)
+            cached = CACHE.get(key)
             if cached is not None:
                 return cached
-            result = await func(*args, **kwargs)
-            await CACHE.set(key, result, ttl)
-            return result
+            task = _INFLIGHT.get(key)
+            if task is None:
+                task = asyncio.ensure_future(_fill(key, ttl, func, args, kwargs))
+                _INFLIGHT[key] = task
+                task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+            # shield: one caller being cancelled must not cancel the fill the others wait on
+            return await asyncio.shield(task)
+
+        def prime(value: Any, *args, **kwargs) -> None:
+            CACHE.set(make_key(args, kwargs), value, ttl)
+
+        inner.prime = prime
         return inner
     return wrap
\ No newline at end of file
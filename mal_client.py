@@ -1,13 +1,72 @@
 # mal_client.py
 import os
+import re
+import socket
+import asyncio
+import datetime
 import aiohttp
-from typing import List, Dict, Any, Optional
+import pytz
+from typing import List, Dict, Any, Optional, Tuple, Union
 from cache import aiorun_cached
 from models import parse_anime, parse_manga, Anime, Manga
 
+# orjson decodes MAL payloads several times faster than the stdlib; fall back if unavailable
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
+
 BASE = "https://api.myanimelist.net/v2"
 FIELDS_ANIME = "id,title,main_picture,mean,rank,status,num_episodes,start_date"
 FIELDS_MANGA = "id,title,main_picture,mean,rank,status,num_chapters,num_volumes,start_date"
+FIELDS_INFO = "id,title,main_picture,synopsis,mean,rank,status,num_episodes,num_chapters,start_date"
+SEASONS = ("winter", "spring", "summer", "fall")
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+# membership checks on the command path use hashed sets; the tuples above keep their order for indexing
+_VALID_KINDS = frozenset({"anime", "manga"})
+_VALID_SEASONS = frozenset(SEASONS)
+_VALID_DAYS = frozenset(DAYS)
+_MAL_URL_RE = re.compile(r"myanimelist\.net/(anime|manga)/(\d+)")
+# MAL's seasons and broadcast weekdays are in Japan time, not the server's (UTC on Render)
+MAL_TZ = pytz.timezone("Asia/Tokyo")
+
+# Max MAL requests in flight at once; bursts beyond this queue locally instead of earning 429s.
+MAL_CONCURRENCY = int(os.getenv("MAL_CONCURRENCY", "10"))
+# Connection pool bounds. Every request goes to api.myanimelist.net through the MAL_CONCURRENCY
+# semaphore, so that is the real limit; the pool is sized from it rather than tuned separately.
+POOL_LIMIT = POOL_PER_HOST = MAL_CONCURRENCY
+# Set MAL_IPV4_ONLY=1 on hosts with broken IPv6 to skip the v6 connect attempt entirely.
+MAL_FAMILY = socket.AF_INET if os.getenv("MAL_IPV4_ONLY") else socket.AF_UNSPEC
+
+def _info_from_node(kind: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a MAL node fetched with FIELDS_INFO into the dict utils.embed_from_info renders."""
+    pic = data.get("main_picture") or {}
+    return {
+        "title": data.get("title"),
+        "url": f"https://myanimelist.net/{kind}/{data['id']}",
+        "synopsis": data.get("synopsis"),
+        "score": data.get("mean"),
+        "rank": data.get("rank"),
+        "episodes": data.get("num_episodes"),
+        "chapters": data.get("num_chapters"),
+        "status": data.get("status"),
+        "start_date": data.get("start_date"),
+        "image_url": pic.get("large") or pic.get("medium"),
+    }
+
+
+def mal_today() -> datetime.date:
+    """Today's date in JST, the timezone MAL uses for seasons and broadcast days."""
+    return datetime.datetime.now(MAL_TZ).date()
+
+
+def current_season(today: Optional[datetime.date] = None) -> Tuple[int, str]:
+    """(year, season) for a date; MAL seasons start in January, April, July and October."""
+    today = today or mal_today()
+    return today.year, SEASONS[(today.month - 1) // 3]
+
 
 class MALClient:
     """
@@ -24,27 +83,40 @@ class MALClient:
         self._session: Optional[aiohttp.ClientSession] = session
         # If session was provided externally we should not close it here
         self._own_session: bool = session is None
+        self._closed = False
+        self._sem = asyncio.Semaphore(MAL_CONCURRENCY)
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        """Create a session with the MAL headers and an explicitly sized connection pool."""
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_PER_HOST,
+            # resolved addresses are cached for 5 min; with aiodns installed aiohttp resolves
+            # through c-ares instead of a thread-pool getaddrinfo on cache misses
+            ttl_dns_cache=300,
+            # keep idle sockets longer than aiohttp's 15s default; commands arrive in bursts
+            keepalive_timeout=75,
+            enable_cleanup_closed=True,
+            # fall back to the next address family sooner when IPv6 is broken on the host
+            happy_eyeballs_delay=0.1,
+            family=MAL_FAMILY,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers={"X-MAL-CLIENT-ID": self.client_id, "Accept": "application/json"},
+        )
 
     # ---------- context manager ----------
     async def __aenter__(self):
+        self._closed = False
         # create session if we don't already have one
         if self._session is None or getattr(self._session, "closed", False):
-            # create a session with the required headers
-            self._session = aiohttp.ClientSession(
-                headers={"X-MAL-CLIENT-ID": self.client_id, "Accept": "application/json"}
-            )
+            self._session = self._new_session()
             self._own_session = True
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        # close the session if we created it
-        if self._own_session and self._session is not None:
-            try:
-                if not self._session.closed:
-                    await self._session.close()
-            finally:
-                self._session = None
-                self._own_session = False
+        await self.close()
 
     # Defensive: if someone accidentally uses a sync `with MALClient()` raise a helpful error
     def __enter__(self):
@@ -56,7 +128,9 @@ class MALClient:
 
     # Allow explicit close when not using context manager
     async def close(self):
-        if self._session is not None:
+        # only close the session if we created it; an injected session belongs to the caller
+        self._closed = True
+        if self._own_session and self._session is not None:
             try:
                 if not self._session.closed:
                     await self._session.close()
@@ -67,59 +141,151 @@ class MALClient:
     @property
     def session(self) -> aiohttp.ClientSession:
         """
-        Return a ClientSession. If one does not exist yet, create one.
+        Return the client's ClientSession, creating it on first use.
+        A closed client (or a closed injected session) raises instead of silently
+        building a fresh session, which would hide session leaks.
         Note: this is synchronous; it constructs aiohttp.ClientSession without awaiting,
         which is acceptable here because creating the session is not an async coroutine.
         """
-        if self._session is None or getattr(self._session, "closed", False):
-            self._session = aiohttp.ClientSession(
-                headers={"X-MAL-CLIENT-ID": self.client_id, "Accept": "application/json"}
-            )
+        if self._closed:
+            raise RuntimeError("MALClient is closed")
+        if self._session is None:
+            self._session = self._new_session()
             self._own_session = True
+        elif self._session.closed:
+            raise RuntimeError("MALClient session has been closed")
         return self._session
 
     # ----------------- internal helper -----------------
     async def _get(self, path: str, **params) -> Dict[str, Any]:
         url = f"{BASE}{path}"
-        # ensure we operate with an active session; if session was closed, property recreates it
+        # the property creates the session on first use and raises once the client is closed
         sess = self.session
-        async with sess.get(url, params=params, timeout=aiohttp.ClientTimeout(total=20)) as r:
+        async with self._sem, sess.get(url, params=params, timeout=aiohttp.ClientTimeout(total=20)) as r:
             if r.status == 429:
                 raise RuntimeError("MAL rate limited. Try again shortly.")
             if r.status >= 400:
                 text = await r.text()
                 raise RuntimeError(f"MAL error {r.status}: {text}")
-            return await r.json()
+            return _json_loads(await r.read())
 
     # ---- Search ----
-    @aiorun_cached(ttl=300)
+    async def search(self, kind: str, query: str, limit: int = 5) -> List[Union[Anime, Manga]]:
+        """
+        Search anime or manga. The query is normalised (whitespace collapsed, casefolded)
+        and the limit clamped first, so equivalent searches share one cache entry.
+        """
+        query = " ".join(query.split()).casefold()
+        limit = max(1, min(limit, 10))
+        if kind == "anime":
+            return await self.search_anime(query, limit=limit)
+        if kind == "manga":
+            return await self.search_manga(query, limit=limit)
+        raise RuntimeError(f"Searching '{kind}' is not supported by the MAL API")
+
+    @aiorun_cached(ttl=600)
     async def search_anime(self, query: str, limit: int = 5) -> List[Anime]:
         data = await self._get("/anime", q=query, limit=min(limit, 10), fields=FIELDS_ANIME)
         return [parse_anime(n) for n in data.get("data", [])]
 
-    @aiorun_cached(ttl=300)
+    @aiorun_cached(ttl=600)
     async def search_manga(self, query: str, limit: int = 5) -> List[Manga]:
         data = await self._get("/manga", q=query, limit=min(limit, 10), fields=FIELDS_MANGA)
         return [parse_manga(n) for n in data.get("data", [])]
 
     # ---- Rankings ----
-    @aiorun_cached(ttl=600)
+    @aiorun_cached(ttl=900)
     async def top_airing_anime(self, limit: int = 5) -> List[Anime]:
         data = await self._get("/anime/ranking", ranking_type="airing", limit=min(limit, 10), fields=FIELDS_ANIME)
         return [parse_anime(n) for n in data.get("data", [])]
 
-    @aiorun_cached(ttl=600)
+    @aiorun_cached(ttl=1800)
     async def trending_anime(self, limit: int = 5) -> List[Anime]:
         data = await self._get("/anime/ranking", ranking_type="bypopularity", limit=min(limit, 10), fields=FIELDS_ANIME)
         return [parse_anime(n) for n in data.get("data", [])]
 
-    @aiorun_cached(ttl=600)
+    @aiorun_cached(ttl=1800)
     async def trending_manga(self, limit: int = 5) -> List[Manga]:
         data = await self._get("/manga/ranking", ranking_type="bypopularity", limit=min(limit, 10), fields=FIELDS_MANGA)
         return [parse_manga(n) for n in data.get("data", [])]
 
     # ---- Seasonals (current airing season) ----
-    @aiorun_cached(ttl=600)
     async def seasonal(self, year: int, season: str, limit: int = 5) -> List[Anime]:
+        """Anime of a MAL season. The season is normalised first so "Fall" and "fall" share one cache entry."""
+        season = season.lower()
+        if season not in _VALID_SEASONS:
+            raise RuntimeError(f"Unknown season '{season}' (expected one of: {', '.join(SEASONS)})")
+        return await self._seasonal(year, season, limit=limit)
+
+    @aiorun_cached(ttl=3600)
+    async def _seasonal(self, year: int, season: str, limit: int = 5) -> List[Anime]:
         data = await self._get(f"/anime/season/{year}/{season}", limit=min(limit, 10), fields=FIELDS_ANIME)
         return [parse_anime(n) for n in data.get("data", [])]
+
+    async def next_season(self, limit: int = 10) -> List[Anime]:
+        year, season = current_season()
+        idx = SEASONS.index(season) + 1
+        if idx == len(SEASONS):
+            year, idx = year + 1, 0
+        return await self.seasonal(year, SEASONS[idx], limit=limit)
+
+    async def schedule(self, day: str, limit: int = 10) -> List[Anime]:
+        """
+        Current-season anime broadcasting on `day` (a weekday name or "today"), per MAL's broadcast info.
+        Filtering is done per call over the cached season list, so every weekday shares one fetch.
+        """
+        day = day.lower()
+        if day == "today":
+            day = DAYS[mal_today().weekday()]
+        if day not in _VALID_DAYS:
+            raise RuntimeError(f"Unknown day '{day}' (expected a weekday name or 'today')")
+        nodes = await self._season_nodes(*current_season())
+        airing = [n for n in nodes if (n.get("broadcast") or {}).get("day_of_the_week") == day]
+        return [parse_anime(n) for n in airing[:limit]]
+
+    @aiorun_cached(ttl=3600)
+    async def _season_nodes(self, year: int, season: str) -> List[Dict[str, Any]]:
+        """Raw nodes (with broadcast info) for the whole season; the largest response the bot requests."""
+        data = await self._get(f"/anime/season/{year}/{season}", limit=500, fields=FIELDS_ANIME + ",broadcast")
+        return [n.get("node", n) for n in data.get("data", [])]
+
+    # ---- Details ----
+    async def info(self, identifier: str, kind: str = "anime") -> Dict[str, Any]:
+        """
+        Details for one anime/manga, looked up by MAL id, MAL url or title (best search match).
+        Returned as a flat dict in the shape utils.embed_from_info renders.
+        """
+        m = _MAL_URL_RE.search(identifier)
+        if m:
+            kind, identifier = m.group(1), m.group(2)
+        if kind not in _VALID_KINDS:
+            raise RuntimeError(f"Unknown kind '{kind}' (expected anime or manga)")
+        try:
+            mal_id = int(identifier)
+        except ValueError:
+            return await self.find(kind, " ".join(identifier.split()).casefold())
+        return await self.details(kind, mal_id)
+
+    @aiorun_cached(ttl=3600)
+    async def find(self, kind: str, query: str) -> Dict[str, Any]:
+        """
+        Details for the best search match of `query`, in one request: the search asks for
+        FIELDS_INFO directly, and the result also primes details() for that id.
+        """
+        data = await self._get(f"/{kind}", q=query, limit=1, fields=FIELDS_INFO)
+        nodes = data.get("data", [])
+        if not nodes:
+            raise RuntimeError(f"No {kind} found for '{query}'")
+        node = nodes[0].get("node", nodes[0])
+        result = _info_from_node(kind, node)
+        MALClient.details.prime(result, self, kind, node["id"])
+        return result
+
+    @aiorun_cached(ttl=3600)
+    async def details(self, kind: str, mal_id: int) -> Dict[str, Any]:
+        """
+        Detail lookup by (kind, MAL id). Cached on that pair, so id, url and title
+        lookups that resolve to the same entry share one cached fetch.
+        """
+        data = await self._get(f"/{kind}/{mal_id}", fields=FIELDS_INFO)
+        return _info_from_node(kind, data)
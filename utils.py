@@ -1,6 +1,7 @@
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Dict, Any, Optional, Tuple, List, Union
 import datetime
 import discord
+from models import Anime, Manga
 
 def human_readable_kind(kind: str) -> str:
     m = {
@@ -31,87 +32,45 @@ def extract_image_url(data: Dict[str, Any]) -> Optional[str]:
     if not data:
         return None
     # common keys: 'image_url', 'images' etc
-    if "image_url" in data and data["image_url"]:
+    if data.get("image_url"):
         return data["image_url"]
-    if "images" in data:
-        # may have images['jpg']['image_url']
-        imgs = data["images"]
-        if isinstance(imgs, dict):
-            # try common MAL v2 json structure
-            for k in ("jpg", "webp"):
-                if k in imgs and isinstance(imgs[k], dict) and imgs[k].get("image_url"):
-                    return imgs[k]["image_url"]
-    # fallback
-    return None
+    # may have images['jpg']['image_url'] (or the webp variant)
+    imgs = data.get("images") or {}
+    return (imgs.get("jpg") or {}).get("image_url") or (imgs.get("webp") or {}).get("image_url")
 
 
-def _format_title_and_url(data: Dict[str, Any], kind: str) -> Tuple[str, Optional[str]]:
+def _format_title_and_url(item: Union[Anime, Manga]) -> Tuple[str, Optional[str]]:
     """
     Return (title_text, mal_url) for a search result item.
     Keep title_text short.
     """
-    if not data:
-        return ("Unknown", None)
-
-    # possible shapes: data['title'], data['name']
-    title = data.get("title") or data.get("name") or data.get("alternative_title") or "Unknown"
-
-    # MAL v2: may contain 'url' or 'node' etc
-    url = data.get("url") or data.get("mal_url")
-    # sometimes MAL search returns 'node' or 'entry' with 'url' inside
-    if not url:
-        for key in ("node", "entry", "anime", "manga"):
-            if data.get(key) and isinstance(data[key], dict) and data[key].get("url"):
-                url = data[key]["url"]
-                break
-
+    title = item.title or "Unknown"
     # trim extremely long titles
     if len(title) > 80:
         title = title[:77] + "..."
-    return (title, url)
+    return (title, item.url)
 
 
-def _format_meta_line(data: Dict[str, Any]) -> str:
+def _format_meta_line(item: Union[Anime, Manga]) -> str:
     """
     Build a compact single-line metadata string (rating, rank, episodes, status, start date).
     Example: "⭐ 8.28 • #325 • EP: 500 • Finished_airing • Started: 2007-02-15"
     """
     parts = []
-    # score / rating
-    score = data.get("score") or data.get("mean") or data.get("rating")
-    if score is not None:
-        try:
-            parts.append(f"⭐ {float(score):.2f}")
-        except Exception:
-            parts.append(f"⭐ {score}")
-
-    # rank
-    rank = data.get("rank") or data.get("ranking")
-    if rank:
-        parts.append(f"#{rank}")
-
-    # episodes / volumes / chapters
-    eps = data.get("episodes") or data.get("episodes_count") or data.get("ep")
-    if eps:
-        parts.append(f"EP: {eps}")
-
-    # status
-    status = data.get("status") or data.get("publication_status")
-    if status:
-        parts.append(str(status))
-
-    # started / aired
-    started = None
-    if "start_date" in data and data["start_date"]:
-        started = data["start_date"]
-    elif "aired" in data and isinstance(data["aired"], dict) and data["aired"].get("from"):
-        started = data["aired"]["from"]
-    if started:
-        # keep only date part if iso datetime
-        if isinstance(started, str) and "T" in started:
-            started = started.split("T", 1)[0]
-        parts.append(f"Started: {started}")
-
+    if item.mean is not None:
+        parts.append(f"⭐ {item.mean:.2f}")
+    if item.rank:
+        parts.append(f"#{item.rank}")
+    # episodes (anime) / chapters (manga)
+    if isinstance(item, Anime):
+        if item.episodes:
+            parts.append(f"EP: {item.episodes}")
+    elif item.chapters:
+        parts.append(f"CH: {item.chapters}")
+    if item.status:
+        parts.append(item.status)
+    if item.start_date:
+        parts.append(f"Started: {item.start_date}")
     return " • ".join(parts)
 
 
@@ -135,6 +94,7 @@ def embed_from_info(data: Dict[str, Any], kind: str = "anime") -> discord.Embed:
     score = data.get("score")
     rank = data.get("rank")
     episodes = data.get("episodes")
+    chapters = data.get("chapters")
     status = data.get("status")
     started = None
     if "start_date" in data:
@@ -147,6 +107,8 @@ def embed_from_info(data: Dict[str, Any], kind: str = "anime") -> discord.Embed:
         embed.add_field(name="Rank", value=str(rank), inline=True)
     if episodes:
         embed.add_field(name="Episodes", value=str(episodes), inline=True)
+    if chapters:
+        embed.add_field(name="Chapters", value=str(chapters), inline=True)
     if status:
         embed.add_field(name="Status", value=str(status), inline=True)
     if started: